@@ -3,7 +3,6 @@ import sys
 import os
 import time
 import sqlite3
-import ast
 from collections import deque
 from typing import List, Tuple, Dict, Optional
 from ortools.sat.python import cp_model
@@ -16,7 +15,6 @@ BALL_RADIUS = 20
 TUBE_WIDTH = 60
 TUBE_SPACING = 80
 MOVE_SPEED = 10
-ANIMATION_DELAY = 0.02
 
 # ------------------------------------------------------------------------------
 # Domain Classes
@@ -25,16 +23,39 @@ ANIMATION_DELAY = 0.02
 class BallSortState:
     """
     Represents an immutable puzzle state.
-    Each state is a tuple of tubes (each tube is a tuple of ball colors).
+    The state is stored flat: 'flat' holds MAX_CAPACITY slots per tube
+    (bottom to top, 0 for an empty slot) and 'heights' the number of balls
+    in each tube. Ball colors must therefore be positive integers.
     """
-    def __init__(self, tubes: Tuple[Tuple[int, ...], ...]):
-        self.tubes = tubes
+    def __init__(self, flat: Tuple[int, ...], heights: Tuple[int, ...]):
+        self.flat = flat
+        self.heights = heights
+
+    @classmethod
+    def from_tubes(cls, tubes: Tuple[Tuple[int, ...], ...]) -> "BallSortState":
+        flat = []
+        for tube in tubes:
+            if len(tube) > MAX_CAPACITY:
+                raise ValueError(f"Tube {tube} holds more than MAX_CAPACITY={MAX_CAPACITY} balls")
+            flat.extend(tube)
+            flat.extend([0] * (MAX_CAPACITY - len(tube)))
+        return cls(tuple(flat), tuple(len(tube) for tube in tubes))
+
+    @property
+    def tubes(self) -> Tuple[Tuple[int, ...], ...]:
+        """
+        The state as a tuple of tubes (each tube is a tuple of ball colors).
+        """
+        return tuple(
+            self.flat[i * MAX_CAPACITY:i * MAX_CAPACITY + h]
+            for i, h in enumerate(self.heights)
+        )
 
     def __hash__(self):
-        return hash(self.tubes)
+        return hash(self.flat)
 
     def __eq__(self, other):
-        return isinstance(other, BallSortState) and self.tubes == other.tubes
+        return isinstance(other, BallSortState) and self.flat == other.flat
 
     def __str__(self):
         return str(self.tubes)
@@ -65,7 +86,19 @@ class BallSortPuzzle:
     """
     def __init__(self, tube_data: List[List[int]]):
         # tube_data: each inner list represents a tube from bottom to top.
-        self.initial_state = BallSortState(tuple(tuple(tube) for tube in tube_data))
+        # Colors are relabeled 1, 2, ... in order of first appearance (tubes
+        # left to right, balls bottom to top), so puzzles that only differ by
+        # color names share one state graph. States and moves use the labels;
+        # original_colors maps a label back to the input color.
+        self.color_labels: Dict[int, int] = {}
+        for tube in tube_data:
+            for ball in tube:
+                if ball not in self.color_labels:
+                    self.color_labels[ball] = len(self.color_labels) + 1
+        self.original_colors = {label: color for color, label in self.color_labels.items()}
+        self.initial_state = BallSortState.from_tubes(
+            tuple(tuple(self.color_labels[ball] for ball in tube) for tube in tube_data)
+        )
         self.num_tubes = len(tube_data)
 
     def is_solved(self, state: BallSortState) -> bool:
@@ -74,69 +107,200 @@ class BallSortPuzzle:
         (i.e., all balls in that tube are of the same color).
         (It is allowed that two or more tubes contain the same color.)
         """
-        for tube in state.tubes:
-            if tube and not all(ball == tube[0] for ball in tube):
-                return False
-        return True
+        return is_solved_blob(_encode(state))
+
+    def canonicalize(self, state: BallSortState) -> BallSortState:
+        """
+        Returns the canonical representative of the state's symmetry class:
+        the same tubes sorted lexicographically. States that only differ by
+        the order of their tubes (e.g. which of two empty tubes received a
+        ball) share one canonical form, so the state graph stores them once.
+        """
+        return BallSortState(*canonicalize_raw(state.flat, state.heights))
 
     def get_legal_moves(self, state: BallSortState) -> List[Move]:
         """
-        Returns a list of legal moves from the given state.
+        Returns the legal moves worth exploring from the given state.
         A move is legal if:
           - The source tube is non‑empty.
           - The destination tube is not full.
           - Either the destination is empty or its top ball matches the moving ball.
           - Source and destination are different.
+        Some legal moves into an empty tube are left out because they cannot
+        shorten a solution: moves out of a monochrome tube, and moves into
+        any empty tube but the first (see get_legal_moves_raw).
         """
-        moves = []
-        for src in range(self.num_tubes):
-            tube_src = state.tubes[src]
-            if not tube_src:
-                continue  # nothing to move
-            ball = tube_src[-1]
-            for dst in range(self.num_tubes):
-                if src == dst:
-                    continue
-                tube_dst = state.tubes[dst]
-                if len(tube_dst) >= MAX_CAPACITY:
-                    continue
-                if tube_dst and tube_dst[-1] != ball:
-                    continue
-                moves.append(Move(src, dst, ball))
-        return moves
+        return [Move(src, dst, color) for src, dst, color in get_legal_moves_raw(state.flat, state.heights)]
 
     def apply_move(self, state: BallSortState, move: Move) -> BallSortState:
         """
         Returns a new state after applying the given move.
         """
-        new_tubes = [list(tube) for tube in state.tubes]
-        ball = new_tubes[move.src].pop()
-        new_tubes[move.dst].append(ball)
-        return BallSortState(tuple(tuple(tube) for tube in new_tubes))
+        return BallSortState(*apply_move_raw(state.flat, state.heights, move.src, move.dst))
+
+
+def get_legal_moves_raw(flat: Tuple[int, ...], heights: Tuple[int, ...]) -> Tuple[Tuple[int, int, int], ...]:
+    """
+    Core of BallSortPuzzle.get_legal_moves, on the flat state layout.
+    Returns the legal moves as (src, dst, color) triples.
+    Moves into an empty tube are pruned when they cannot be productive:
+      - the source tube is monochrome (the move only relocates part of it);
+      - another empty tube was already offered (the results are symmetric).
+    """
+    num_tubes = len(heights)
+    moves = []
+    for src in range(num_tubes):
+        h_src = heights[src]
+        if not h_src:
+            continue  # nothing to move
+        src_base = src * MAX_CAPACITY
+        ball = flat[src_base + h_src - 1]
+        src_monochrome = flat[src_base:src_base + h_src].count(ball) == h_src
+        empty_offered = False
+        for dst in range(num_tubes):
+            if src == dst:
+                continue
+            h_dst = heights[dst]
+            if h_dst >= MAX_CAPACITY:
+                continue
+            if not h_dst:
+                if src_monochrome or empty_offered:
+                    continue
+                empty_offered = True
+            elif flat[dst * MAX_CAPACITY + h_dst - 1] != ball:
+                continue
+            moves.append((src, dst, ball))
+    return tuple(moves)
+
+
+def apply_move_raw(flat: Tuple[int, ...], heights: Tuple[int, ...],
+                   src: int, dst: int) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+    """
+    Returns the (flat, heights) pair after moving the top ball of tube 'src'
+    onto tube 'dst'.
+    """
+    new_flat = list(flat)
+    new_heights = list(heights)
+    src_pos = src * MAX_CAPACITY + new_heights[src] - 1
+    ball = new_flat[src_pos]
+    new_flat[src_pos] = 0
+    new_heights[src] -= 1
+    new_flat[dst * MAX_CAPACITY + new_heights[dst]] = ball
+    new_heights[dst] += 1
+    return tuple(new_flat), tuple(new_heights)
+
+
+def canonical_order(flat: Tuple[int, ...], num_tubes: int) -> List[int]:
+    """
+    Returns the tube indices of 'flat' in canonical (sorted) order: position k
+    of the canonical state holds the tube at index order[k] of 'flat'.
+    """
+    return sorted(range(num_tubes), key=lambda i: flat[i * MAX_CAPACITY:(i + 1) * MAX_CAPACITY])
+
+
+def canonicalize_raw(flat: Tuple[int, ...], heights: Tuple[int, ...]) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+    """
+    Flat-layout core of BallSortPuzzle.canonicalize.
+    """
+    tubes = sorted(
+        (flat[i * MAX_CAPACITY:(i + 1) * MAX_CAPACITY], h)
+        for i, h in enumerate(heights)
+    )
+    return tuple(ball for tube, _ in tubes for ball in tube), tuple(h for _, h in tubes)
 
 
 # ------------------------------------------------------------------------------
 # Disk-Based State Graph Storage (using SQLite)
 # ------------------------------------------------------------------------------
 
+def _encode(state: BallSortState) -> bytes:
+    """
+    Packs a state into a fixed-width BLOB: one byte per tube slot, with
+    0 marking an empty slot (the state's flat layout, byte for byte).
+    """
+    return bytes(state.flat)
+
+
+def _decode(blob: bytes) -> BallSortState:
+    """
+    Inverse of _encode.
+    """
+    heights = tuple(
+        len(blob[i:i + MAX_CAPACITY].rstrip(b'\x00'))
+        for i in range(0, len(blob), MAX_CAPACITY)
+    )
+    return BallSortState(tuple(blob), heights)
+
+
+def is_solved_blob(blob: bytes) -> bool:
+    """
+    BallSortPuzzle.is_solved on an encoded state: every non-empty tube slice
+    must consist of a single repeated byte (checked with bytes.count).
+    """
+    for i in range(0, len(blob), MAX_CAPACITY):
+        tube = blob[i:i + MAX_CAPACITY].rstrip(b'\x00')
+        if tube and tube.count(tube[:1]) != len(tube):
+            return False
+    return True
+
+
+def bfs(initial_state: BallSortState, max_depth: int) -> Tuple[List[bytes], List[Tuple[int, int, int, int, int]]]:
+    """
+    Breadth-first search from 'initial_state' (which must be canonical) up to
+    max_depth moves, entirely in memory on the flat layout: no DB access and
+    no per-edge object allocation besides the successor tuples.
+    Returns (states, transitions): the encoded states in discovery order, where
+    the 1-based position of a state is its id, and the transitions as
+    (from_state, to_state, src_tube, dst_tube, ball_color) rows.
+    """
+    visited: Dict[Tuple[int, ...], int] = {initial_state.flat: 1}
+    states = [_encode(initial_state)]
+    transitions = []
+    queue = deque()
+    queue.append((1, initial_state.flat, initial_state.heights, 0))
+    while queue:
+        state_id, flat, heights, depth = queue.popleft()
+        if depth >= max_depth:
+            continue
+        for src, dst, color in get_legal_moves_raw(flat, heights):
+            new_flat, new_heights = canonicalize_raw(*apply_move_raw(flat, heights, src, dst))
+            new_state_id = visited.get(new_flat)
+            if new_state_id is None:
+                states.append(bytes(new_flat))
+                new_state_id = len(states)
+                visited[new_flat] = new_state_id
+                queue.append((new_state_id, new_flat, new_heights, depth + 1))
+            transitions.append((state_id, new_state_id, src, dst, color))
+    return states, transitions
+
+
 class StateGraphDB:
     """
     Stores the state graph on disk using SQLite.
     Two tables are used:
-      - 'states' stores each unique state (as a string) and its id.
+      - 'states' stores each unique state (as a BLOB, see _encode) and its id.
       - 'transitions' stores transitions (edges) with details of the move.
     """
     def __init__(self, db_filename: str, puzzle: BallSortPuzzle):
         self.db_filename = db_filename
         self.puzzle = puzzle
-        self.conn = sqlite3.connect(self.db_filename)
+        # Transactions are managed explicitly (see build_graph).
+        self.conn = sqlite3.connect(self.db_filename, isolation_level=None)
         self.create_tables()
     
     def create_tables(self):
         c = self.conn.cursor()
+        # The database is a throwaway cache dropped by cleanup(), so trade
+        # durability for bulk-insert speed. The journal is kept in memory
+        # rather than turned off so that build_graph can still roll back.
+        c.execute("PRAGMA journal_mode=MEMORY")
+        c.execute("PRAGMA synchronous=OFF")
+        c.execute("PRAGMA temp_store=MEMORY")
+        c.execute("PRAGMA locking_mode=EXCLUSIVE")
+        c.execute("PRAGMA cache_size=-131072")  # 128 MB
         c.execute('''CREATE TABLE IF NOT EXISTS states (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        state TEXT UNIQUE
+                        state BLOB UNIQUE
                      )''')
         c.execute('''CREATE TABLE IF NOT EXISTS transitions (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -148,61 +312,39 @@ class StateGraphDB:
                      )''')
         self.conn.commit()
     
-    def insert_state(self, state: BallSortState) -> int:
+    def insert_transitions(self, rows: List[Tuple[int, int, int, int, int]]):
         """
-        Inserts a state into the DB (if not already present) and returns its id.
+        Inserts a batch of transitions given as
+        (from_state, to_state, src_tube, dst_tube, ball_color) rows.
         """
-        state_str = str(state.tubes)
         c = self.conn.cursor()
-        try:
-            c.execute("INSERT INTO states (state) VALUES (?)", (state_str,))
-            self.conn.commit()
-        except sqlite3.IntegrityError:
-            pass  # already exists
-        c.execute("SELECT id FROM states WHERE state=?", (state_str,))
-        row = c.fetchone()
-        return row[0]
-    
-    def insert_transition(self, from_id: int, to_id: int, move: Move):
-        """
-        Inserts a transition (edge) into the DB.
-        """
-        c = self.conn.cursor()
-        c.execute("INSERT INTO transitions (from_state, to_state, src_tube, dst_tube, ball_color) VALUES (?, ?, ?, ?, ?)",
-                  (from_id, to_id, move.src, move.dst, move.color))
-        self.conn.commit()
+        c.executemany("INSERT INTO transitions (from_state, to_state, src_tube, dst_tube, ball_color) VALUES (?, ?, ?, ?, ?)",
+                      rows)
     
     def build_graph(self, max_depth: int):
         """
-        Performs a BFS from the initial state up to max_depth moves.
-        States and transitions are stored on disk.
+        Builds the state graph up to max_depth moves (see bfs) and stores it
+        on disk, replacing any graph already stored.
+        Only canonical states (see BallSortPuzzle.canonicalize) are stored, and
+        the tube indices of a transition refer to its canonical from_state.
+        All rows are written in a single transaction with executemany; if the
+        load fails it is rolled back and the previous graph is kept.
+        The (from_state, to_state) index used by get_transition_move is only
+        created once the bulk insert is done.
         """
-        queue = deque()
-        initial_state = self.puzzle.initial_state
-        initial_id = self.insert_state(initial_state)
-        queue.append((initial_id, 0))
-        visited = {initial_id}
+        states, transitions = bfs(self.puzzle.canonicalize(self.puzzle.initial_state), max_depth)
         c = self.conn.cursor()
-        
-        while queue:
-            state_id, depth = queue.popleft()
-            if depth >= max_depth:
-                continue
-            c.execute("SELECT state FROM states WHERE id=?", (state_id,))
-            row = c.fetchone()
-            if row is None:
-                continue
-            state_str = row[0]
-            tubes = ast.literal_eval(state_str)
-            current_state = BallSortState(tubes)
-            moves = self.puzzle.get_legal_moves(current_state)
-            for move in moves:
-                new_state = self.puzzle.apply_move(current_state, move)
-                new_state_id = self.insert_state(new_state)
-                self.insert_transition(state_id, new_state_id, move)
-                if new_state_id not in visited:
-                    visited.add(new_state_id)
-                    queue.append((new_state_id, depth + 1))
+        self.conn.execute("BEGIN")
+        try:
+            c.execute("DELETE FROM transitions")
+            c.execute("DELETE FROM states")
+            c.executemany("INSERT INTO states (id, state) VALUES (?, ?)", enumerate(states, 1))
+            self.insert_transitions(transitions)
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_trans_ft ON transitions(from_state, to_state)")
     
     def get_num_states(self) -> int:
         c = self.conn.cursor()
@@ -211,22 +353,18 @@ class StateGraphDB:
         return row[0]
     
     def get_initial_state_id(self) -> int:
-        initial_state_str = str(self.puzzle.initial_state.tubes)
+        initial_state_blob = _encode(self.puzzle.canonicalize(self.puzzle.initial_state))
         c = self.conn.cursor()
-        c.execute("SELECT id FROM states WHERE state=?", (initial_state_str,))
+        c.execute("SELECT id FROM states WHERE state=?", (initial_state_blob,))
         row = c.fetchone()
         return row[0] if row else -1
     
-    def get_allowed_transitions(self) -> List[List[int]]:
+    def get_allowed_transitions(self) -> List[Tuple[int, int]]:
         """
-        Returns a list of pairs [from_state, to_state] representing allowed transitions.
+        Returns a list of (from_state, to_state) pairs representing allowed transitions.
         """
         c = self.conn.cursor()
-        c.execute("SELECT from_state, to_state FROM transitions")
-        transitions = []
-        for row in c.fetchall():
-            transitions.append([row[0], row[1]])
-        return transitions
+        return c.execute("SELECT from_state, to_state FROM transitions").fetchall()
     
     def get_transition_move(self, from_state: int, to_state: int) -> Optional[Move]:
         """
@@ -245,8 +383,7 @@ class StateGraphDB:
         c.execute("SELECT state FROM states WHERE id=?", (state_id,))
         row = c.fetchone()
         if row:
-            tubes = ast.literal_eval(row[0])
-            return BallSortState(tubes)
+            return _decode(row[0])
         return None
 
     def get_db_size(self):
@@ -275,8 +412,11 @@ class StateGraphDB:
 class CPPathSolver:
     """
     Uses OR-Tools CP-SAT to select a valid sequence of states over time.
-    This version builds a mapping between the database's state IDs and a dense
-    range of indices [0, num_states-1] used for the CP model.
+    build_graph stores states with the dense ids 1..num_states, so CP index i
+    is simply DB state id i + 1 (indices range over [0, num_states-1]).
+    A single model is built for the maximum horizon: solved states may stay
+    put, and the solver maximizes the number of timesteps spent in a solved
+    state, so the first solved timestep is the shortest solution length.
     """
     def __init__(self, graph_db: StateGraphDB, horizon: int):
         self.graph_db = graph_db
@@ -284,16 +424,17 @@ class CPPathSolver:
         self.model = cp_model.CpModel()
         self.state_vars = []  # List of cp_model.IntVar (indices)
         self.solver = cp_model.CpSolver()
-        self.db_state_ids = []  # List of DB state IDs (ordered)
-        self.id_to_index: Dict[int, int] = {}
+        # Run CP-SAT's parallel portfolio search on every core.
+        self.solver.parameters.num_search_workers = os.cpu_count() or 8
+        self.solver.parameters.log_search_progress = False
+        # Presolve probing on the expanded automaton costs far more than the
+        # search itself on these models.
+        self.solver.parameters.cp_model_probing_level = 0
+        self.at_goal = []  # List of cp_model.BoolVar, true when X_t is solved
 
     def build_model(self):
-        # Build mapping from DB state IDs to dense indices.
         c = self.graph_db.conn.cursor()
-        c.execute("SELECT id FROM states ORDER BY id")
-        self.db_state_ids = [row[0] for row in c.fetchall()]
-        num_states = len(self.db_state_ids)
-        self.id_to_index = {db_id: idx for idx, db_id in enumerate(self.db_state_ids)}
+        num_states = self.graph_db.get_num_states()
         
         # Create CP state variables that range over these indices.
         self.state_vars = [
@@ -302,38 +443,61 @@ class CPPathSolver:
         ]
         # (1) Fix the initial state.
         init_db_state_id = self.graph_db.get_initial_state_id()
-        if init_db_state_id not in self.id_to_index:
-            raise ValueError("Initial state not found in DB mapping.")
-        init_index = self.id_to_index[init_db_state_id]
+        if init_db_state_id == -1:
+            raise ValueError("Initial state not found in DB.")
+        init_index = init_db_state_id - 1
         self.model.Add(self.state_vars[0] == init_index)
         
-        # (2) Constrain the final state to be solved.
+        # (2) Collect the solved states in a single pass over the states table.
         solved_indices = []
-        for db_id in self.db_state_ids:
-            state = self.graph_db.get_state_by_id(db_id)
-            if state and self.graph_db.puzzle.is_solved(state):
-                solved_indices.append(self.id_to_index[db_id])
+        for db_id, state_blob in c.execute("SELECT id, state FROM states"):
+            if is_solved_blob(state_blob):
+                solved_indices.append(db_id - 1)
         if not solved_indices:
             self.model.Add(self.state_vars[self.horizon] == -1)
-        else:
-            self.model.AddAllowedAssignments([self.state_vars[self.horizon]], [[i] for i in solved_indices])
+            return
         
-        # (3) Allowed transitions.
-        allowed_transitions_db = self.graph_db.get_allowed_transitions()
-        allowed_transitions = []
-        for (from_state, to_state) in allowed_transitions_db:
-            if from_state in self.id_to_index and to_state in self.id_to_index:
-                allowed_transitions.append([self.id_to_index[from_state], self.id_to_index[to_state]])
-        for t in range(self.horizon):
-            self.model.AddAllowedAssignments([self.state_vars[t], self.state_vars[t+1]], allowed_transitions)
+        # (3) Allowed transitions, posted once as an automaton over X_1..X_horizon
+        # that starts at the initial state and must end in a solved state.
+        # Each edge is labelled with its target state, so reading label X_t
+        # moves the automaton to state X_t. Solved states get a self-loop so a
+        # path that reaches the goal early can wait there until the horizon.
+        # With a zero horizon there are no transitions: X_0 itself must be solved.
+        if self.horizon > 0:
+            allowed_transitions_db = self.graph_db.get_allowed_transitions()
+            transition_triples = {(i, i, i) for i in solved_indices}
+            for from_state, to_state in allowed_transitions_db:
+                transition_triples.add((from_state - 1, to_state - 1, to_state - 1))
+            self.model.AddAutomaton(self.state_vars[1:], init_index, solved_indices, list(transition_triples))
+        else:
+            self.model.AddAllowedAssignments([self.state_vars[0]], [[i] for i in solved_indices])
+
+        # (4) Reach the goal as early as possible. Once there, the path stays
+        # put, which removes equivalent "wander between solved states" tails.
+        is_goal = [0] * num_states
+        for i in solved_indices:
+            is_goal[i] = 1
+        self.at_goal = []
+        for t, var in enumerate(self.state_vars):
+            at_goal = self.model.NewBoolVar(f"at_goal_{t}")
+            self.model.AddElement(var, is_goal, at_goal)
+            if t > 0:
+                self.model.Add(var == self.state_vars[t - 1]).OnlyEnforceIf(self.at_goal[-1])
+            self.at_goal.append(at_goal)
+        self.model.Maximize(sum(self.at_goal))
 
     def solve(self) -> Optional[List[int]]:
+        """
+        Returns the DB state IDs of the solution path, up to and including
+        the first solved state, or None if no solution exists within the horizon.
+        """
         self.build_model()
         status = self.solver.Solve(self.model)
         if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-            sol_indices = [self.solver.Value(var) for var in self.state_vars]
+            goal_t = next(t for t, b in enumerate(self.at_goal) if self.solver.Value(b))
+            sol_indices = [self.solver.Value(var) for var in self.state_vars[:goal_t + 1]]
             # Convert CP indices back to actual DB state IDs.
-            sol_db_ids = [self.db_state_ids[i] for i in sol_indices]
+            sol_db_ids = [i + 1 for i in sol_indices]
             return sol_db_ids
         return None
 
@@ -350,12 +514,22 @@ class CPModelInterpreter:
         self.graph_db = graph_db
 
     def extract_moves(self, state_path: List[int]) -> Optional[List[Move]]:
+        """
+        Stored moves use the tube indices of the canonical states, so each one
+        is mapped back onto the actual tube layout by replaying the solution
+        from the initial state. Ball colors are mapped back to the input colors.
+        """
+        puzzle = self.graph_db.puzzle
+        state = puzzle.initial_state
         moves = []
         for i in range(len(state_path) - 1):
             move = self.graph_db.get_transition_move(state_path[i], state_path[i+1])
             if move is None:
                 return None
-            moves.append(move)
+            order = canonical_order(state.flat, puzzle.num_tubes)
+            src, dst = order[move.src], order[move.dst]
+            state = BallSortState(*apply_move_raw(state.flat, state.heights, src, dst))
+            moves.append(Move(src, dst, puzzle.original_colors[move.color]))
         return moves
 
 
@@ -374,29 +548,54 @@ class Visualizer:
         self.tubes = []  # list of dicts holding tube position and current ball list
         self.width = max(800, len(tube_data) * TUBE_SPACING + 100)
         self.height = 600
-        self.screen = pygame.display.set_mode((self.width, self.height))
+        self.screen = pygame.display.set_mode((self.width, self.height), pygame.DOUBLEBUF | pygame.SCALED, vsync=1)
         pygame.display.set_caption("Ball Sort Puzzle CP Solution")
         self.clock = pygame.time.Clock()
+        self.background = pygame.Surface((self.width, self.height)).convert(self.screen)  # tubes and resting balls
+        self.tube_layer = pygame.Surface((self.width, self.height)).convert(self.screen)  # empty tubes, drawn once
+        self.tube_layer.fill((0, 0, 0))
         # Initialize tube positions.
         for i in range(len(tube_data)):
             x = i * TUBE_SPACING + 50
             y = 100
-            self.tubes.append({'x': x, 'y': y, 'balls': list(tube_data[i])})
+            # Ball centers: one x per tube, one y per slot (bottom to top).
+            slot_y = tuple(y + MAX_CAPACITY * 2 * BALL_RADIUS - (j * 40) - BALL_RADIUS
+                           for j in range(MAX_CAPACITY))
+            self.tubes.append({'x': x, 'y': y, 'cx': x + TUBE_WIDTH // 2, 'slot_y': slot_y,
+                               'balls': list(tube_data[i])})
+            pygame.draw.rect(self.tube_layer, (255, 255, 255),
+                             (x, y, TUBE_WIDTH, MAX_CAPACITY * 2 * BALL_RADIUS), 2)
 
-    def draw(self):
-        self.screen.fill((0, 0, 0))
+    def draw_static(self):
+        """
+        Renders the tubes and their resting balls onto the background surface.
+        Called only when a ball leaves or lands in a tube, not on every frame.
+        """
+        self.background.blit(self.tube_layer, (0, 0))
         for tube in self.tubes:
-            x = tube['x']
-            y = tube['y']
-            pygame.draw.rect(self.screen, (255, 255, 255),
-                             (x, y, TUBE_WIDTH, MAX_CAPACITY * 2 * BALL_RADIUS), 2)
+            cx = tube['cx']
+            slot_y = tube['slot_y']
             for i, ball in enumerate(tube['balls']):
-                ball_x = x + TUBE_WIDTH // 2
-                ball_y = y + MAX_CAPACITY * 2 * BALL_RADIUS - (i * 40) - BALL_RADIUS
-                pygame.draw.circle(self.screen, self.color_mapping.get(ball, (200, 200, 200)),
-                                   (ball_x, ball_y), BALL_RADIUS)
+                pygame.draw.circle(self.background, self.color_mapping.get(ball, (200, 200, 200)),
+                                   (cx, slot_y[i]), BALL_RADIUS)
+
+    def draw(self):
+        self.draw_static()
+        self.screen.blit(self.background, (0, 0))
         pygame.display.flip()
 
+    def draw_moving_ball(self, ball: int, prev_rect: pygame.Rect, pos: Tuple[int, int]) -> pygame.Rect:
+        """
+        Erases the ball at prev_rect, draws it at pos and pushes only those two
+        regions to the display. Returns the ball's new bounding rect.
+        """
+        self.screen.blit(self.background, prev_rect, prev_rect)
+        rect = pygame.draw.circle(self.screen, self.color_mapping.get(ball, (200, 200, 200)),
+                                  pos, BALL_RADIUS)
+        pygame.display.update([prev_rect, rect])
+        self.clock.tick(60)
+        return rect
+
     def animate_move(self, move: Move):
         """
         Animates moving the top ball from tube[move.src] to tube[move.dst].
@@ -406,44 +605,31 @@ class Visualizer:
         ball = self.tubes[move.src]['balls'].pop()
         src_tube = self.tubes[move.src]
         dst_tube = self.tubes[move.dst]
-        start_x = src_tube['x'] + TUBE_WIDTH // 2
-        start_y = src_tube['y'] + MAX_CAPACITY * 2 * BALL_RADIUS - (len(src_tube['balls']) * 40) - BALL_RADIUS
-        dst_ball_count = len(dst_tube['balls'])
-        target_x = dst_tube['x'] + TUBE_WIDTH // 2
-        target_y = dst_tube['y'] + MAX_CAPACITY * 2 * BALL_RADIUS - (dst_ball_count * 40) - BALL_RADIUS
+        start_x = src_tube['cx']
+        start_y = src_tube['slot_y'][len(src_tube['balls'])]
+        target_x = dst_tube['cx']
+        target_y = dst_tube['slot_y'][len(dst_tube['balls'])]
         current_x, current_y = start_x, start_y
+        # The lifted ball is no longer part of the background.
+        self.draw_static()
+        rect = pygame.Rect(current_x - BALL_RADIUS, current_y - BALL_RADIUS, 2 * BALL_RADIUS, 2 * BALL_RADIUS)
 
         # Animate upward.
         peak_y = src_tube['y'] - 3 * BALL_RADIUS
         while current_y > peak_y:
             current_y -= MOVE_SPEED
-            self.draw()
-            pygame.draw.circle(self.screen, self.color_mapping.get(ball, (200, 200, 200)),
-                               (current_x, current_y), BALL_RADIUS)
-            pygame.display.flip()
-            self.clock.tick(60)
-            time.sleep(ANIMATION_DELAY)
+            rect = self.draw_moving_ball(ball, rect, (current_x, current_y))
         # Animate horizontal.
         while current_x != target_x:
             if current_x < target_x:
                 current_x = min(current_x + MOVE_SPEED, target_x)
             else:
                 current_x = max(current_x - MOVE_SPEED, target_x)
-            self.draw()
-            pygame.draw.circle(self.screen, self.color_mapping.get(ball, (200, 200, 200)),
-                               (current_x, current_y), BALL_RADIUS)
-            pygame.display.flip()
-            self.clock.tick(60)
-            time.sleep(ANIMATION_DELAY)
+            rect = self.draw_moving_ball(ball, rect, (current_x, current_y))
         # Animate downward.
         while current_y < target_y:
             current_y += MOVE_SPEED
-            self.draw()
-            pygame.draw.circle(self.screen, self.color_mapping.get(ball, (200, 200, 200)),
-                               (current_x, current_y), BALL_RADIUS)
-            pygame.display.flip()
-            self.clock.tick(60)
-            time.sleep(ANIMATION_DELAY)
+            rect = self.draw_moving_ball(ball, rect, (current_x, current_y))
         dst_tube['balls'].append(ball)
         self.draw()
 
@@ -465,7 +651,7 @@ class Visualizer:
 
 
 # ------------------------------------------------------------------------------
-# Main: Integrate disk-based state graph, CP, iterative deepening, and visualization.
+# Main: Integrate disk-based state graph, CP, and visualization.
 # ------------------------------------------------------------------------------
 if __name__ == "__main__":
 
@@ -515,20 +701,16 @@ if __name__ == "__main__":
     num_states = graph_db.get_num_states()
     print(f"State graph built with {num_states} states (stored in {db_filename}).")
     
-    # Iterative deepening: try horizons from 1 to max_moves until a solution is found.
-    solution_state_path = None
+    # Solve once over the full horizon; the solver finds the shortest solution.
     solution_moves = None
-    for horizon in range(1, max_moves + 1):
-        print(f"Trying horizon: {horizon}")
-        cp_solver = CPPathSolver(graph_db, horizon)
-        state_path = cp_solver.solve()
-        if state_path is not None:
-            interpreter = CPModelInterpreter(graph_db)
-            solution_moves = interpreter.extract_moves(state_path)
-            if solution_moves is not None:
-                print(f"Solution found with horizon {horizon}.")
-                solution_state_path = state_path
-                break
+    print(f"Solving with maximum horizon: {max_moves}")
+    cp_solver = CPPathSolver(graph_db, max_moves)
+    solution_state_path = cp_solver.solve()
+    if solution_state_path is not None:
+        interpreter = CPModelInterpreter(graph_db)
+        solution_moves = interpreter.extract_moves(solution_state_path)
+        if solution_moves is not None:
+            print(f"Solution found with horizon {len(solution_moves)}.")
 
     if solution_moves is None:
         print("No solution found within", max_moves, "moves.")
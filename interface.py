@@ -1,170 +1,300 @@
+import math
 import pygame
 import sys
-import time
 from utils import parse_ball_sort_file
 
 # Constants
 BALL_RADIUS = 20
 TUBE_SPACING = 80
+TUBE_LEFT = 50  # x of the first tube
 MOVE_SPEED = 10
-ANIMATION_DELAY = 0.01
-
-COLORS = {
-        1: (255, 0, 0),    # Red
-        2: (0, 255, 0),    # Green
-        3: (0, 0, 255),    # Blue
-        4: (255, 255, 0),  # Yellow
-        5: (255, 165, 0),  # Orange
-        6: (128, 0, 128),  # Purple
-        7: (0, 255, 255),  # Cyan
-        8: (255, 192, 203),# Pink
-        9: (165, 42, 42),  # Brown
-        10: (0, 128, 0),    # Dark Green
-        11: (75, 0, 130),   # Indigo
-        12: (60, 255, 255), # Light Cyan
-        13: (192, 192, 192),# Silver
-        14: (255, 20, 147), # Deep Pink
-        15: (255, 69, 0),   # Red-Orange
-        16: (60, 179, 113), # Medium Sea Green
-        17: (30, 144, 255), # Dodger Blue
-        18: (218, 112, 214),# Orchid
-        19: (0, 255, 127),  # Spring Green
-        20: (139, 69, 19),   # Saddle Brown
-        21: (10, 50, 120),
-        22: (100, 0, 255),
-        23: (25, 30, 80),
-        24: (0, 150, 127),
-        25: (139, 355, 19),
-        26: (10, 10, 255)
-}
-
-class Ball:
-    def __init__(self, color):
+FPS = 60
+
+# RGB per color index; parse_ball_sort_file maps 'A' to 0, 'B' to 1, ...
+COLORS = (
+    (255, 0, 0),  # Red
+    (0, 255, 0),  # Green
+    (0, 0, 255),  # Blue
+    (255, 255, 0),  # Yellow
+    (255, 165, 0),  # Orange
+    (128, 0, 128),  # Purple
+    (0, 255, 255),  # Cyan
+    (255, 192, 203),  # Pink
+    (165, 42, 42),  # Brown
+    (0, 128, 0),  # Dark Green
+    (75, 0, 130),  # Indigo
+    (60, 255, 255),  # Light Cyan
+    (192, 192, 192),  # Silver
+    (255, 20, 147),  # Deep Pink
+    (255, 69, 0),  # Red-Orange
+    (60, 179, 113),  # Medium Sea Green
+    (30, 144, 255),  # Dodger Blue
+    (218, 112, 214),  # Orchid
+    (0, 255, 127),  # Spring Green
+    (139, 69, 19),  # Saddle Brown
+    (10, 50, 120),
+    (100, 0, 255),
+    (25, 30, 80),
+    (0, 150, 127),
+    (139, 255, 19),
+    (10, 10, 255),
+)
+
+BALL_SPRITES = [None] * len(COLORS)  # pre-rendered ball Surface per color index, filled by BallSortGame
+
+class SelectedBall:
+    """The ball currently lifted out of a tube: its color index and center."""
+    __slots__ = ('color', 'x', 'y')
+
+    def __init__(self, color, x, y):
         self.color = color
-        self.x = 0
-        self.y = 0
+        self.x = x
+        self.y = y
 
 class Tube:
-    def __init__(self, x, y, balls):
+    def __init__(self, x, y, balls, capacity):
         self.x = x
         self.y = y
         self.width = 60
-        self.height = MAX_CAPACITY * 2 * BALL_RADIUS
-        self.balls = [Ball(COLORS[color]) for color in balls]
+        self.capacity = capacity  # number of ball slots
+        self.height = capacity * 2 * BALL_RADIUS
+        self.balls = list(balls)  # color indices, bottom to top
+        # Height of the single-color run at the bottom of the tube, kept up to
+        # date by push/pop so that purity is an O(1) check.
+        self.mono_height = 0
+        while self.mono_height < len(balls) and balls[self.mono_height] == balls[0]:
+            self.mono_height += 1
+        self.rect = pygame.Rect(self.x, self.y, self.width, self.height)
+        # Ball centers: one x for the tube, one y per slot (bottom to top).
+        self.cx = self.x + self.width // 2
+        self.slot_y = tuple(self.y + self.height - (i * 40) - BALL_RADIUS for i in range(capacity))
+
+    @property
+    def monochrome(self):
+        return self.mono_height == len(self.balls)
+
+    @property
+    def mono_color(self):
+        """Color of a non-empty single-color tube, None otherwise."""
+        if self.balls and self.mono_height == len(self.balls):
+            return self.balls[0]
+        return None
+
+    def push(self, ball):
+        if self.monochrome and (not self.balls or ball == self.balls[0]):
+            self.mono_height += 1
+        self.balls.append(ball)
+
+    def pop(self):
+        ball = self.balls.pop()
+        if self.mono_height > len(self.balls):
+            self.mono_height -= 1
+        return ball
 
     def draw(self, screen):
         pygame.draw.rect(screen, (255, 255, 255), (self.x, self.y, self.width, self.height), 2)
+        cx, slot_y = self.cx, self.slot_y
         for i, ball in enumerate(self.balls):
-            ball.x = self.x + self.width // 2
-            ball.y = self.y + self.height - (i * 40) - BALL_RADIUS
-            pygame.draw.circle(screen, ball.color, (ball.x, ball.y), BALL_RADIUS)
+            screen.blit(BALL_SPRITES[ball], (cx - BALL_RADIUS, slot_y[i] - BALL_RADIUS))
+
+class Animation:
+    """
+    Slides a ball in a straight line from start to end at MOVE_SPEED pixels
+    per frame (at FPS), timed from pygame ticks rather than frame count.
+    """
+    def __init__(self, ball, start, end, on_done=None):
+        self.ball = ball
+        self.start = start
+        self.end = end
+        self.start_ticks = pygame.time.get_ticks()
+        distance = math.hypot(end[0] - start[0], end[1] - start[1])
+        self.duration_ms = distance * 1000 / (MOVE_SPEED * FPS)
+        self.on_done = on_done
+
+    def position(self, now):
+        """Returns the ball position at tick 'now' and whether the slide is over."""
+        if now - self.start_ticks >= self.duration_ms:
+            return self.end, True
+        t = (now - self.start_ticks) / self.duration_ms
+        x = round(self.start[0] + (self.end[0] - self.start[0]) * t)
+        y = round(self.start[1] + (self.end[1] - self.start[1]) * t)
+        return (x, y), False
 
 class BallSortGame:
     def __init__(self, tube_data):
         pygame.init()
-        self.tubes = [Tube(i * TUBE_SPACING + 50, 100, tube) for i, tube in enumerate(tube_data)]
+        # Only these events are handled; keep SDL from queueing the rest
+        # (mouse motion in particular arrives at the mouse polling rate).
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN])
+        # Every tube holds as many balls as the fullest tube of the layout.
+        capacity = max((len(tube) for tube in tube_data), default=0)
+        self.tubes = [Tube(i * TUBE_SPACING + TUBE_LEFT, 100, tube, capacity) for i, tube in enumerate(tube_data)]
         self.width = max(800, len(self.tubes) * TUBE_SPACING + 100)
         self.height = 600
-        self.screen = pygame.display.set_mode((self.width, self.height))
+        self.screen = pygame.display.set_mode((self.width, self.height), pygame.DOUBLEBUF | pygame.SCALED, vsync=1)
+        # Blitting a pre-rendered sprite is much cheaper than rasterizing a
+        # circle; convert_alpha() matches the display's pixel format.
+        for color, rgb in enumerate(COLORS):
+            sprite = pygame.Surface((2 * BALL_RADIUS, 2 * BALL_RADIUS), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, rgb, (BALL_RADIUS, BALL_RADIUS), BALL_RADIUS)
+            BALL_SPRITES[color] = sprite.convert_alpha(self.screen)
+        self.clock = pygame.time.Clock()
         self.selected_tube = None
         self.selected_ball = None
         self.running = True
+        self.animations = []
+        # Static scene (tubes and resting balls), painted once and then only
+        # patched per tube; draw() restores the dirty regions from it.
+        self.background = pygame.Surface((self.width, self.height)).convert(self.screen)
+        self.background.fill((0, 0, 0))
+        for tube in self.tubes:
+            tube.draw(self.background)
+        self.screen.blit(self.background, (0, 0))
+        pygame.display.flip()
+        self.dirty = []
+        self.tube_rects = [tube.rect for tube in self.tubes]
+
+    def ball_rect(self, ball):
+        return pygame.Rect(ball.x - BALL_RADIUS, ball.y - BALL_RADIUS, 2 * BALL_RADIUS, 2 * BALL_RADIUS)
+
+    def redraw_tube(self, tube):
+        """Re-bakes a tube whose contents changed into the background."""
+        self.background.fill((0, 0, 0), tube.rect)
+        tube.draw(self.background)
+        self.dirty.append(tube.rect)
 
     def draw(self):
-        self.screen.fill((0, 0, 0))
-        for tube in self.tubes:
-            tube.draw(self.screen)
+        if not self.dirty:
+            return
+        for rect in self.dirty:
+            # Outside the tubes the background is plain black.
+            if rect.collidelist(self.tube_rects) == -1:
+                self.screen.fill((0, 0, 0), rect)
+            else:
+                self.screen.blit(self.background, rect, rect)
         if self.selected_ball:
-            pygame.draw.circle(self.screen, self.selected_ball.color, (self.selected_ball.x, self.selected_ball.y), BALL_RADIUS)
-        pygame.display.flip()
+            ball = self.selected_ball
+            self.screen.blit(BALL_SPRITES[ball.color], (ball.x - BALL_RADIUS, ball.y - BALL_RADIUS))
+        pygame.display.update(self.dirty)
+        self.dirty.clear()
+
+    def move_ball_to(self, ball, x, y):
+        """Moves a ball, marking its old and new areas dirty."""
+        self.dirty.append(self.ball_rect(ball))
+        ball.x = x
+        ball.y = y
+        self.dirty.append(self.ball_rect(ball))
+
+    def animate(self, end, on_done=None):
+        """Starts sliding the selected ball to 'end'; on_done runs when it arrives."""
+        ball = self.selected_ball
+        self.animations.append(Animation(ball, (ball.x, ball.y), end, on_done))
+
+    def update_animations(self):
+        now = pygame.time.get_ticks()
+        for anim in list(self.animations):
+            (x, y), done = anim.position(now)
+            self.move_ball_to(anim.ball, x, y)
+            if done:
+                self.animations.remove(anim)
+                if anim.on_done:
+                    anim.on_done()
 
     def animate_selection(self, tube):
         if not tube.balls:
             return
-        self.selected_ball = tube.balls.pop()
+        color = tube.pop()
+        self.selected_ball = SelectedBall(color, tube.cx, tube.slot_y[len(tube.balls)])
+        self.redraw_tube(tube)
         peak_height = tube.y - 3 * BALL_RADIUS
+        self.animate((self.selected_ball.x, peak_height))
 
-        while self.selected_ball.y > peak_height:
-            self.selected_ball.y -= MOVE_SPEED
-            self.draw()
-            time.sleep(ANIMATION_DELAY)
+    def _can_place(self, to_tube):
+        if len(to_tube.balls) >= to_tube.capacity:
+            return False
+        return not to_tube.balls or to_tube.balls[-1] == self.selected_ball.color
 
     def move_ball(self, from_tube, to_tube):
-        if not self.selected_ball or len(to_tube.balls) >= MAX_CAPACITY:
-            self.move_ball(None, from_tube)
+        if not self.selected_ball:
             return
-        
-        if from_tube != to_tube:
-            if to_tube.balls:
-                if self.selected_ball.color != to_tube.balls[-1].color:
-                    self.move_ball(from_tube, from_tube)
-                    return
-
-        
-        target_x = to_tube.x + to_tube.width // 2
-        target_y = to_tube.y + to_tube.height - len(to_tube.balls) * 40 - BALL_RADIUS
-
-        while self.selected_ball.x != target_x:
-            self.selected_ball.x += MOVE_SPEED if self.selected_ball.x < target_x else -MOVE_SPEED
-            self.draw()
-            time.sleep(ANIMATION_DELAY)
+        if to_tube is not from_tube and not self._can_place(to_tube):
+            to_tube = from_tube  # invalid move: put the ball back where it came from
 
-        while self.selected_ball.y < target_y:
-            self.selected_ball.y += MOVE_SPEED
-            self.draw()
-            time.sleep(ANIMATION_DELAY)
-        to_tube.balls.append(self.selected_ball)
-        self.selected_ball = None  
+        target_x = to_tube.cx
+        target_y = to_tube.slot_y[len(to_tube.balls)]
+
+        self.animate((target_x, self.selected_ball.y),
+                     on_done=lambda: self.animate((target_x, target_y),
+                                                  on_done=lambda: self.land_ball(to_tube)))
+
+    def land_ball(self, tube):
+        self.dirty.append(self.ball_rect(self.selected_ball))
+        tube.push(self.selected_ball.color)
+        self.selected_ball = None
+        self.redraw_tube(tube)
+        # The board only changes when a ball lands, so this is the only place
+        # the win condition needs checking.
+        if self.check_win():
+            print("Congratulations! You won!")
+            self.running = False
 
     def check_win(self):
         if self.selected_ball:
             return False
 
-        color_tubes = {}
+        # One bit per color: a color already seen means it is split across tubes.
+        seen = 0
         for tube in self.tubes:
-            if tube.balls:
-                colors = set(ball.color for ball in tube.balls)
-                if len(colors) > 1:
-                    return False  
-                color = tube.balls[0].color
-                color_tubes[color] = color_tubes.get(color, 0) + 1
-
-        return all(count == 1 for count in color_tubes.values())
+            color = tube.mono_color
+            if color is None:
+                if tube.balls:
+                    return False
+                continue
+            bit = 1 << color
+            if seen & bit:
+                return False
+            seen |= bit
+        return True
 
     def handle_click(self, x, y):
-        for tube in self.tubes:
-            if tube.x < x < tube.x + tube.width and tube.y < y < tube.y + tube.height:
-                if self.selected_tube:
-                    self.move_ball(self.selected_tube, tube)
-                    self.selected_tube = None
-                else:
-                    if tube.balls:
-                        self.selected_tube = tube
-                        self.animate_selection(tube)
-                break
+        if self.animations:
+            return  # ignore clicks while a ball is moving
+        # Tubes sit on a fixed horizontal grid, so the column gives the only
+        # candidate tube; its cached rect settles the hit test.
+        index = (x - TUBE_LEFT) // TUBE_SPACING
+        if not 0 <= index < len(self.tubes):
+            return
+        tube = self.tubes[index]
+        if not tube.rect.collidepoint(x, y):
+            return
+        if self.selected_tube:
+            self.move_ball(self.selected_tube, tube)
+            self.selected_tube = None
+        else:
+            if tube.balls:
+                self.selected_tube = tube
+                self.animate_selection(tube)
 
     def run(self):
-        i = 0
         while self.running:
+            # Drain the whole queue once per frame, before updating and drawing.
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     self.running = False
                 elif event.type == pygame.MOUSEBUTTONDOWN:
-                    print(i)
-                    i += 1
                     self.handle_click(*event.pos)
+            self.update_animations()
             self.draw()
-            if self.check_win():
-                print("Congratulations! You won!")
-                self.running = False
+            self.clock.tick(FPS)
         pygame.quit()
         sys.exit()
 
 
-file_path = r"tests/L7.txt"
-raw_tube_data = parse_ball_sort_file(file_path)
-MAX_CAPACITY = max([len(x) for x in raw_tube_data])
-
+if __name__ == "__main__":
+    file_path = r"tests/L7.txt"
+    # Read-only from here on: Tube copies each row into its own list of balls.
+    raw_tube_data = tuple(map(tuple, parse_ball_sort_file(file_path)))
 
-game = BallSortGame(raw_tube_data)
-game.run()
+    game = BallSortGame(raw_tube_data)
+    game.run()